@@ -12,13 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import configparser
+import collections
+import contextlib
+import functools
+import grp
+import io
 import json
 import os
+import pwd
 import re
-import shutil
 import subprocess
-import tenacity
+import sys
 
 import charms_openstack.charm
 import charms_openstack.adapters
@@ -30,30 +34,158 @@ import charmhelpers.contrib.network.ip as ch_net_ip
 
 import charmhelpers.contrib.database.mysql as mysql
 
-import charmhelpers.contrib.openstack.templating as os_templating
-
 
 # Flag Strings
-MYSQL_ROUTER_BOOTSTRAPPED = "charm.mysqlrouter.bootstrapped"
-MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED = "charm.mysqlrouter.bootstrap-attempted"
-MYSQL_ROUTER_STARTED = "charm.mysqlrouter.started"
-DB_ROUTER_AVAILABLE = "db-router.available"
-DB_ROUTER_PROXY_AVAILABLE = "db-router.available.proxy"
+# Flags are used as dict keys throughout charms.reactive, intern them so key
+# comparisons can short-circuit on identity. Literals containing '.' or '-'
+# are not interned automatically.
+MYSQL_ROUTER_BOOTSTRAPPED = sys.intern("charm.mysqlrouter.bootstrapped")
+MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED = sys.intern(
+    "charm.mysqlrouter.bootstrap-attempted")
+MYSQL_ROUTER_INSTALLED = sys.intern("charm.mysqlrouter.installed")
+MYSQL_ROUTER_STARTED = sys.intern("charm.mysqlrouter.started")
+DB_ROUTER_AVAILABLE = sys.intern("db-router.available")
+DB_ROUTER_PROXY_AVAILABLE = sys.intern("db-router.available.proxy")
+
+# unitdata key used to detect changes to the proxied db-router responses
+PROXY_RESPONSES_DATA_ID = "charm.mysqlrouter.proxy-responses"
+# Part of the inputs recorded under PROXY_RESPONSES_DATA_ID. Bump it when
+# what proxy_db_and_user_responses publishes changes, so that upgraded
+# units re-publish their responses even if the relation data is the same.
+PROXY_RESPONSES_REVISION = 1
 
 # Section configuration search keys for setting configuration values
 # Note, mysql object names can contain alphanumeric and $ characters.
 DEFAULT_SECTION = 'DEFAULT'
 LOGGING_SECTION = 'logger'
-METADATA_CACHE_SECTION = r'metadata_cache:[\w$]+$'
-ROUTING_RW_SECTION = r'routing:[\w$]+_rw(?<!_x_rw)$'
-ROUTING_RO_SECTION = r'routing:[\w$]+_ro(?<!_x_ro)$'
-ROUTING_X_RO_SECTION = r'routing:[\w$]+_x_ro$'
-ROUTING_X_RW_SECTION = r'routing:[\w$]+_x_rw$'
+# The patterns are anchored with \Z rather than $, which would also accept a
+# trailing newline, and the lookbehinds are only tried once the end is reached.
+METADATA_CACHE_SECTION = r'metadata_cache:[\w$]+\Z'
+ROUTING_RW_SECTION = r'routing:[\w$]+_rw\Z(?<!_x_rw)'
+ROUTING_RO_SECTION = r'routing:[\w$]+_ro\Z(?<!_x_ro)'
+ROUTING_X_RO_SECTION = r'routing:[\w$]+_x_ro\Z'
+ROUTING_X_RW_SECTION = r'routing:[\w$]+_x_rw\Z'
+
+# The section search keys above match disjoint sets of sections, so they are
+# combined into a single pattern with one named group per key. Parameters
+# dictionaries keep using the raw strings as keys.
+_SECTION_HEADINGS = (DEFAULT_SECTION, LOGGING_SECTION, METADATA_CACHE_SECTION,
+                     ROUTING_RW_SECTION, ROUTING_RO_SECTION,
+                     ROUTING_X_RO_SECTION, ROUTING_X_RW_SECTION)
+_SECTION_CLASSIFIER = re.compile("|".join(
+    "(?P<h{}>{})".format(i, heading)
+    for i, heading in enumerate(_SECTION_HEADINGS)))
+
+# Number of trailing lines of command output kept by _run for error reporting
+RUN_OUTPUT_TAIL = 20
+
+
+def _run(cmd, stdin=None):
+    """Run a command, keeping only the tail of its output.
+
+    stdout and stderr are merged and drained as the command runs, so a verbose
+    command can never stall on a full pipe buffer. The output is discarded on
+    success; each juju log call forks juju-log, so it is not logged line by
+    line. A command exiting before reading all of stdin is reported through
+    its exit status, and undecodable output is replaced rather than raising.
+
+    :param cmd: Command to execute
+    :type cmd: List[str]
+    :param stdin: Data to write to the command's stdin, which is then closed
+    :type stdin: Optional[str]
+    :raises: subprocess.CalledProcessError if the command fails, with the
+             last RUN_OUTPUT_TAIL lines of output as its output
+    :returns: This function is called for its side effect
+    :rtype: None
+    """
+    with subprocess.Popen(cmd,
+                          stdin=None if stdin is None else subprocess.PIPE,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT,
+                          text=True,
+                          errors="replace") as proc:
+        if stdin is not None:
+            with contextlib.suppress(BrokenPipeError):
+                proc.stdin.write(stdin)
+            with contextlib.suppress(BrokenPipeError):
+                proc.stdin.close()
+        tail = collections.deque(proc.stdout, maxlen=RUN_OUTPUT_TAIL)
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(
+            proc.returncode, cmd, output="".join(tail))
+
+
+def _classify_section(section):
+    """Find which of the section search keys matches a section name.
+
+    :param section: mysqlrouter.conf section name
+    :type section: str
+    :returns: The matching search key or None
+    :rtype: Union[str, None]
+    """
+    m = _SECTION_CLASSIFIER.match(section)
+    if m:
+        return _SECTION_HEADINGS[int(m.lastgroup[1:])]
+
+
+@functools.lru_cache(maxsize=None)
+def _pkg_at_least(package, revno):
+    """Check whether the installed version of a package is at least revno.
+
+    cmp_pkgrevno shells out to dpkg, so the answer is cached; call
+    _pkg_at_least.cache_clear() after installing or upgrading packages.
+
+    :param package: Package name
+    :type package: str
+    :param revno: Version to compare with
+    :type revno: str
+    :returns: True if the installed version is revno or later
+    :rtype: bool
+    """
+    return ch_core.host.cmp_pkgrevno(package, revno) >= 0
+
+
+@functools.lru_cache(maxsize=None)
+def _retrying(wait=None):
+    """Get the retry controller used while waiting for a working router.
+
+    tenacity pulls in asyncio, so it is only imported by the hooks which
+    actually restart mysqlrouter.
+
+    With a wait, retries back off exponentially from half a second up to
+    wait seconds, and keep going until both 5 attempts have been made and
+    4 * wait seconds have passed, the same patience as 5 attempts spaced
+    wait seconds apart but noticing a router that is up early much sooner.
+
+    :param wait: Maximum seconds to wait between attempts, if any
+    :type wait: Optional[int]
+    :returns: Controller retrying OperationalErrors at least 5 attempts
+    :rtype: tenacity.Retrying
+    """
+    import tenacity
+    stop = tenacity.stop_after_attempt(5)
+    kwargs = {}
+    if wait:
+        stop = tenacity.stop_all(stop, tenacity.stop_after_delay(4 * wait))
+        kwargs["wait"] = tenacity.wait_exponential(
+            multiplier=0.5, min=0.5, max=wait)
+    return tenacity.Retrying(
+        retry=tenacity.retry_if_exception_type(
+            mysql.MySQLdb._exceptions.OperationalError),
+        reraise=True,
+        stop=stop,
+        **kwargs)
 
 
 @charms_openstack.adapters.config_property
 def db_router_address(cls):
-    return ch_net_ip.get_relation_ip("db-router")
+    # Resolving the relation address means parsing network configuration,
+    # so only do it once per adapter instance.
+    try:
+        return cls._db_router_address
+    except AttributeError:
+        cls._db_router_address = ch_net_ip.get_relation_ip("db-router")
+        return cls._db_router_address
 
 
 @charms_openstack.adapters.config_property
@@ -73,6 +205,9 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
     required_relations = ["db-router", "shared-db"]
     source_config_key = "source"
     mysql_connect_timeout = 30
+    # Timeout for the connection made by the status check, above
+    # mysqlrouter's own 5 second connect_timeout to the cluster
+    mysql_status_connect_timeout = 10
 
     systemd_file = os.path.join(
         "/etc/systemd/system",
@@ -90,9 +225,51 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
     # TODO Pick group owner
     group = "mysql"
 
+    # Path to the mysqlrouter binary
+    mysqlrouter_bin = "/usr/bin/mysqlrouter"
+    # Home directory of the system user mysqlrouter runs as
+    mysqlrouter_home_dir = "/var/lib/mysql"
+    mysqlrouter_user = "mysql"
+    mysqlrouter_group = "mysql"
+
+    # This unit's Shared-DB address, the same as the shared_db_address
+    # config property: shared-db is a subordinate relation so mysql
+    # communication runs over localhost
+    shared_db_address = "127.0.0.1"
+
+    # Prefix and username used on the db-router relation to access the
+    # MySQL InnoDB Cluster
+    db_prefix = "mysqlrouter"
+    db_router_user = "{}user".format(db_prefix)
+
+    # Password file templates for mysql.MySQL8Helper
+    _rpasswdf_template = "/var/lib/charm/{}/mysql.passwd".format(name)
+    _upasswdf_template = "/var/lib/charm/{}/mysql-{{}}.passwd".format(name)
+
+    # Charm specific states for states_to_check
+    _charm_states = (
+        (MYSQL_ROUTER_BOOTSTRAPPED,
+         "waiting",
+         "MySQL Router not yet bootstrapped"),
+        (MYSQL_ROUTER_STARTED,
+         "waiting",
+         "MySQL Router not yet started"),
+        (DB_ROUTER_PROXY_AVAILABLE,
+         "waiting",
+         "Waiting for proxied DB creation from cluster"))
+
     # For internal use with mysql.get_db_data
     _unprefixed = "MRUP"
 
+    # (key, MySQL8Helper) cached by _db_helper
+    _db_helper_cache = None
+
+    # (stat key, ConfigParser) cached by _read_config
+    _conf_cache = None
+
+    # (release, template loader) cached by _template_loader
+    _loader_cache = None
+
     # mysql.MySQLdb._exceptions.OperationalError error 2013
     # LP Bug #1915842
     _waiting_for_initial_communication_packet_error = 2013
@@ -101,27 +278,58 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
     # LP Bug #1973177
     _cannot_connect_via_ip = 2003
 
-    @property
-    def mysqlrouter_pid_file(self):
-        """Determine the path for the mysqlrouter PID file.
+    def _template_loader(self):
+        """Get the template loader for this instance's release.
+
+        The loader is built on first use and only rebuilt if the release
+        changes.
 
         :param self: Self
         :type self: MySQLRouterCharm instance
-        :returns: Path to the PID file in /run
-        :rtype: str
+        :returns: Template loader for the charm's templates directory
+        :rtype: jinja2.BaseLoader
         """
-        return "/run/mysql/mysqlrouter-{}.pid".format(self.name)
+        if (self._loader_cache is None or
+                self._loader_cache[0] != self.release):
+            # Only needed when rendering templates at install time, so keep
+            # it off the import path of every other hook.
+            import charmhelpers.contrib.openstack.templating as os_templating
+            self._loader_cache = (
+                self.release,
+                os_templating.get_loader('templates/', self.release))
+        return self._loader_cache[1]
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _json_cached(raw):
+        """Decode a JSON encoded relation value, memoizing the result.
+
+        Relation data does not change within a hook, and the same values
+        (password, db_host, etc.) are decoded many times per hook. Keying the
+        cache on the raw string means a changed value is simply a cache miss.
+        Plain strings without quotes or escapes, which is what most of these
+        values are, are unquoted without going through the JSON decoder.
+
+        :param raw: JSON encoded value
+        :type raw: str
+        :returns: Decoded value
+        :rtype: Any
+        """
+        if (len(raw) >= 2 and raw[0] == raw[-1] == '"' and
+                '"' not in raw[1:-1] and '\\' not in raw):
+            return raw[1:-1]
+        return json.loads(raw)
 
-    @property
-    def mysqlrouter_bin(self):
-        """Determine the path to the mysqlrouter binary.
+    @functools.cached_property
+    def mysqlrouter_pid_file(self):
+        """Determine the path for the mysqlrouter PID file.
 
         :param self: Self
         :type self: MySQLRouterCharm instance
-        :returns: Path to the binary
+        :returns: Path to the PID file in /run
         :rtype: str
         """
-        return "/usr/bin/mysqlrouter"
+        return "/run/mysql/mysqlrouter-{}.pid".format(self.name)
 
     @property
     def db_router_endpoint(self):
@@ -134,28 +342,6 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         """
         return reactive.relations.endpoint_from_flag("db-router.available")
 
-    @property
-    def db_prefix(self):
-        """Determine the prefix to use on the db-router relation.
-
-        :param self: Self
-        :type self: MySQLRouterCharm instance
-        :returns: Prefix
-        :rtype: str
-        """
-        return "mysqlrouter"
-
-    @property
-    def db_router_user(self):
-        """Determine the username to access the MySQL InnoDB Cluster.
-
-        :param self: Self
-        :type self: MySQLRouterCharm instance
-        :returns: Username
-        :rtype: str
-        """
-        return "{}user".format(self.db_prefix)
-
     @property
     def db_router_password(self):
         """Determine the password for the MySQL InnoDB Cluster.
@@ -168,7 +354,7 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         :returns: Password
         :rtype: str
         """
-        return json.loads(
+        return self._json_cached(
             self.db_router_endpoint.password(prefix=self.db_prefix))
 
     @property
@@ -197,27 +383,13 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         :returns: Address
         :rtype: str
         """
-        return json.loads(self.db_router_endpoint.db_host())
-
-    @property
-    def shared_db_address(self):
-        """Determine this unit's Shared-DB address.
-
-        Using the class method determine this unit's address for the Shared-DB
-        relation.
-
-        :param self: Self
-        :type self: MySQLRouterCharm instance
-        :returns: Address
-        :rtype: str
-        """
-        return self.options.shared_db_address
+        return self._json_cached(self.db_router_endpoint.db_host())
 
     @property
     def mysqlrouter_port(self):
         return self.options.base_port
 
-    @property
+    @functools.cached_property
     def mysqlrouter_working_dir(self):
         """Determine the path to the mysqlrouter working directory.
 
@@ -228,18 +400,7 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         """
         return "{}/{}".format(self.mysqlrouter_home_dir, self.name)
 
-    @property
-    def mysqlrouter_home_dir(self):
-        """Determine the path to the mysqlrouter working directory.
-
-        :param self: Self
-        :type self: MySQLRouterCharm instance
-        :returns: Path to the directory
-        :rtype: str
-        """
-        return "/var/lib/mysql"
-
-    @property
+    @functools.cached_property
     def mysqlrouter_conf(self):
         """Determine the path to the mysqlrouter.conf file.
 
@@ -248,14 +409,6 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         """
         return "{}/mysqlrouter.conf".format(self.mysqlrouter_working_dir)
 
-    @property
-    def mysqlrouter_user(self):
-        return "mysql"
-
-    @property
-    def mysqlrouter_group(self):
-        return "mysql"
-
     @property
     def ssl_ca(self):
         """Return the SSL Certificate Authority
@@ -266,9 +419,11 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         :rtype: str
         :rtype: Union[str, None]
         """
-        if self.db_router_endpoint:
-            if self.db_router_endpoint.ssl_ca():
-                return json.loads(self.db_router_endpoint.ssl_ca())
+        db_router_endpoint = self.db_router_endpoint
+        if db_router_endpoint:
+            _ssl_ca = db_router_endpoint.ssl_ca()
+            if _ssl_ca:
+                return self._json_cached(_ssl_ca)
 
     @property
     def restart_functions(self):
@@ -287,46 +442,54 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         # Need to configure source first
         self.configure_source()
         super().install()
-
-        # Neither MySQL Router nor MySQL common packaging creates a user, group
-        # or home dir. As we want it to run as a system user in a predictable
-        # location create all of these.
-        # Create the group
-        if not ch_core.host.group_exists(self.mysqlrouter_group):
-            ch_core.host.add_group(
-                self.mysqlrouter_group, system_group=True)
-        # Create the user
-        if not ch_core.host.user_exists(self.mysqlrouter_user):
-            ch_core.host.adduser(
-                self.mysqlrouter_user, shell="/usr/sbin/nologin",
-                system_user=True, primary_group=self.mysqlrouter_group,
-                home_dir=self.mysqlrouter_home_dir)
-        # Create the directory
-        if not os.path.exists(self.mysqlrouter_home_dir):
-            ch_core.host.mkdir(
-                self.mysqlrouter_home_dir,
-                owner=self.mysqlrouter_user,
-                group=self.mysqlrouter_group,
-                perms=0o755)
+        _pkg_at_least.cache_clear()
+
+        # Neither MySQL Router nor MySQL common packaging creates a user,
+        # group or home dir. As we want it to run as a system user in a
+        # predictable location create all of these. This only needs doing
+        # once, so skip the lookups once it has been done.
+        if not reactive.flags.is_flag_set(MYSQL_ROUTER_INSTALLED):
+            # Create the group
+            try:
+                grp.getgrnam(self.mysqlrouter_group)
+            except KeyError:
+                ch_core.host.add_group(
+                    self.mysqlrouter_group, system_group=True)
+            # Create the user
+            try:
+                pwd.getpwnam(self.mysqlrouter_user)
+            except KeyError:
+                ch_core.host.adduser(
+                    self.mysqlrouter_user, shell="/usr/sbin/nologin",
+                    system_user=True, primary_group=self.mysqlrouter_group,
+                    home_dir=self.mysqlrouter_home_dir)
+            # Create the directory
+            if not os.path.exists(self.mysqlrouter_home_dir):
+                ch_core.host.mkdir(
+                    self.mysqlrouter_home_dir,
+                    owner=self.mysqlrouter_user,
+                    group=self.mysqlrouter_group,
+                    perms=0o755)
+            reactive.flags.set_flag(MYSQL_ROUTER_INSTALLED)
 
         # Systemd File
         ch_core.templating.render(
             source="mysqlrouter.service",
-            template_loader=os_templating.get_loader(
-                'templates/', self.release),
+            template_loader=self._template_loader(),
             target=self.systemd_file,
             context=self.adapters_instance,
             group=self.group,
             perms=0o755,
         )
-        cmd = ["systemctl", "enable", self.name]
-        subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+        # NOTE: systemctl enable performs a single daemon-reload of its own,
+        # which also picks up the freshly rendered unit file; splitting this
+        # into enable --no-reload and daemon-reload would only add a fork.
+        _run(["systemctl", "enable", self.name])
 
         # Logrotate File
         ch_core.templating.render(
             source="logrotate",
-            template_loader=os_templating.get_loader(
-                "templates/", self.release),
+            template_loader=self._template_loader(),
             target=self.logrotate_file,
             context={
                 "owner": self.mysqlrouter_user,
@@ -337,14 +500,14 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
 
     def upgrade_charm(self):
         """Custom upgrade charm function to handle special upgrade logic."""
-        config = configparser.ConfigParser()
-        config.read(self.mysqlrouter_conf)
+        config = self._read_config()
 
         with ch_core.host.restart_on_change(
                 self.restart_map,
                 restart_functions=self.restart_functions):
 
             super(MySQLRouterCharm, self).upgrade_charm()
+            _pkg_at_least.cache_clear()
 
             # On upgrade set the unknown_config_option to warning
             # (LP: #1971565)
@@ -360,9 +523,14 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
             # the mysqlrouter.conf file was written which causes the mysql
             # router service to fail to start. Remove the extraneous section
             # at charm upgrade time.
-            sections = list(filter(lambda x: x.startswith('metadata_cache'),
-                                   config.sections()))
-            if len(sections) > 1 and 'metadata_cache:jujuCluster' in sections:
+            count = 0
+            if 'metadata_cache:jujuCluster' in config:
+                for section in config.sections():
+                    if section.startswith('metadata_cache'):
+                        count += 1
+                        if count > 1:
+                            break
+            if count > 1:
                 ch_core.hookenv.log('Found multiple metadata_cache sections. '
                                     'Removing hard-coded '
                                     'metadata_cache:jujuCluster section',
@@ -381,15 +549,68 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         :rtype: MySQLDB8Helper instance
         """
         db_helper = mysql.MySQL8Helper(
-            rpasswdf_template="/var/lib/charm/{}/mysql.passwd"
-                              .format(ch_core.hookenv.service_name()),
-            upasswdf_template="/var/lib/charm/{}/mysql-{{}}.passwd"
-                              .format(ch_core.hookenv.service_name()),
+            rpasswdf_template=self._rpasswdf_template,
+            upasswdf_template=self._upasswdf_template,
             user=self.db_router_user,
             password=self.db_router_password,
             host=self.cluster_address)
         return db_helper
 
+    @property
+    def _db_helper(self):
+        """Get a cached instance of the MySQLDB8Helper class.
+
+        The helper is only rebuilt when the cluster password or address
+        published on the db-router relation change.
+
+        :param self: Self
+        :type self: MySQLRouterCharm instance
+        :returns: Instance of MySQLDB8Helper class
+        :rtype: MySQLDB8Helper instance
+        """
+        key = (self.db_router_password, self.cluster_address)
+        if self._db_helper_cache is None or self._db_helper_cache[0] != key:
+            self._db_helper_cache = (key, self.get_db_helper())
+        return self._db_helper_cache[1]
+
+    def _conf_stat_key(self):
+        """Get a key identifying the current contents of mysqlrouter.conf.
+
+        :param self: Self
+        :type self: MySQLRouterCharm instance
+        :returns: (path, mtime in ns, size) or None if the file is missing
+        :rtype: Union[tuple, None]
+        """
+        try:
+            st = os.stat(self.mysqlrouter_conf)
+        except OSError:
+            return None
+        return (self.mysqlrouter_conf, st.st_mtime_ns, st.st_size)
+
+    def _read_config(self):
+        """Parse mysqlrouter.conf, reusing the last parse if unchanged.
+
+        The parse is reused for as long as the file's mtime and size are
+        unchanged, so callers which modify the returned object must write it
+        back with update_config_parameters.
+
+        :param self: Self
+        :type self: MySQLRouterCharm instance
+        :returns: Parsed mysqlrouter.conf
+        :rtype: configparser.ConfigParser
+        """
+        key = self._conf_stat_key()
+        if (key is not None and self._conf_cache is not None and
+                self._conf_cache[0] == key):
+            return self._conf_cache[1]
+        # Only needed by the hooks which touch mysqlrouter.conf
+        import configparser
+        config = configparser.ConfigParser()
+        config.read(self.mysqlrouter_conf)
+        if key is not None:
+            self._conf_cache = (key, config)
+        return config
+
     def states_to_check(self, required_relations=None):
         """Custom states to check function.
 
@@ -406,16 +627,7 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         :rtype: dict
         """
         states_to_check = super().states_to_check(required_relations)
-        states_to_check["charm"] = [
-            (MYSQL_ROUTER_BOOTSTRAPPED,
-             "waiting",
-             "MySQL Router not yet bootstrapped"),
-            (MYSQL_ROUTER_STARTED,
-             "waiting",
-             "MySQL Router not yet started"),
-            (DB_ROUTER_PROXY_AVAILABLE,
-             "waiting",
-             "Waiting for proxied DB creation from cluster")]
+        states_to_check["charm"] = self._charm_states
 
         return states_to_check
 
@@ -429,17 +641,26 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
                            For use with tenacity retries on specific
                            exceptions.
         :type reraise_on: List[int]
-        :side effect: Uses get_db_helper to execute a connection to the DB.
+        :side effect: Uses _db_helper to execute a connection to the DB.
         :returns: True if connection succeeds or False if not
         :rtype: boolean
         """
-        m_helper = self.get_db_helper()
+        # Status checks get a shorter timeout so a hung router does not
+        # stall the hook; retries (reraise_on) wait for a starting router.
+        # A plain TCP probe is avoided: mysqlrouter counts clients dropping
+        # before the handshake towards max_connect_errors for 127.0.0.1,
+        # which would eventually block the principal's connections.
+        if reraise_on:
+            connect_timeout = self.mysql_connect_timeout
+        else:
+            connect_timeout = self.mysql_status_connect_timeout
+        m_helper = self._db_helper
         try:
             m_helper.connect(self.db_router_user,
                              self.db_router_password,
                              self.shared_db_address,
                              port=self.mysqlrouter_port,
-                             connect_timeout=self.mysql_connect_timeout)
+                             connect_timeout=connect_timeout)
             return True
         except mysql.MySQLdb._exceptions.OperationalError as e:
             ch_core.hookenv.log("Could not connect to db", "DEBUG")
@@ -488,14 +709,15 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         it.
         """
 
-        if os.path.exists(self.mysqlrouter_conf):
-            conf_size = os.path.getsize(self.mysqlrouter_conf)
-            if conf_size <= 1024:
-                self.bootstrap_mysqlrouter(True)
-        else:
+        try:
+            conf_size = os.stat(self.mysqlrouter_conf).st_size
+        except FileNotFoundError:
             ch_core.hookenv.log(
                 "mysql router configuration file is not exist yet.",
                 "WARNING")
+            return
+        if conf_size <= 1024:
+            self.bootstrap_mysqlrouter(True)
 
     def bootstrap_mysqlrouter(self, force=False):
         """Bootstrap MySQL Router.
@@ -525,9 +747,7 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
                "--user", self.mysqlrouter_user,
                "--name", self.name,
                "--bootstrap",
-               "{}:{}@{}".format(self.db_router_user,
-                                 self.db_router_password,
-                                 self.cluster_address),
+               "{}@{}".format(self.db_router_user, self.cluster_address),
                "--directory", self.mysqlrouter_working_dir,
                "--conf-use-sockets",
                "--conf-bind-address", self.shared_db_address,
@@ -535,7 +755,7 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
                "--conf-base-port", str(self.mysqlrouter_port)]
         # Avoid multiple routers trying to bind to the same api port
         # Bug #1911907
-        if ch_core.host.cmp_pkgrevno('mysql-router', '8.0.22') >= 0:
+        if _pkg_at_least('mysql-router', '8.0.22'):
             cmd.append("--disable-rest")
 
         # If we have attempted to bootstrap before but unsuccessfully,
@@ -547,22 +767,25 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
             # clear configuration before force bootstrap
             # because if there are some regex string, it fails
             try:
-                with open(self.mysqlrouter_conf, "wt") as f:
-                    f.write("[DEFAULT]\n")
-            except Exception:
+                with open(self.mysqlrouter_conf, "wb") as f:
+                    f.write(b"[DEFAULT]\n")
+            except OSError as e:
                 ch_core.hookenv.log(
-                    "ignored, because the bootstrap will overwrite the file.")
-                pass
+                    "Failed to clear {}: {}, ignored, because the bootstrap "
+                    "will overwrite the file."
+                    .format(self.mysqlrouter_conf, e), "DEBUG")
 
         # Set and attempt the bootstrap
         reactive.flags.set_flag(MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED)
         try:
-            output = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-            ch_core.hookenv.log(output, "DEBUG")
+            # mysqlrouter prompts for the password as it is not in the
+            # bootstrap URI. Pass it on stdin so it never shows up in the
+            # process list.
+            _run(cmd, stdin="{}\n".format(self.db_router_password))
         except subprocess.CalledProcessError as e:
             ch_core.hookenv.log(
                 "Failed to bootstrap mysqlrouter: {}"
-                .format(e.output.decode("UTF-8")), "ERROR")
+                .format(e.output), "ERROR")
             return
         # Clear the attempted flag as we were successful
         reactive.flags.clear_flag(MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED)
@@ -629,10 +852,16 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         """
         # We can use receiving_interface.all_joined_units.received
         # as this is a subordiante and there is only one unit related.
+        # NOTE: get_db_data deep copies its argument and then pops keys from
+        # the copy, so it must be given a plain dict: a copy of the read-only
+        # JSONUnitDataView would stay read-only and the pops would fail.
         db_data = mysql.get_db_data(
             dict(receiving_interface.all_joined_units.received),
             unprefixed=self._unprefixed)
 
+        # NOTE: The interfaces are reactive Endpoints; writes to to_publish
+        # are buffered and flushed with a single relation-set per relation
+        # when the hook exits, so per-prefix calls do not fork relation-set.
         for prefix in db_data:
             sending_interface.configure_proxy_db(
                 db_data[prefix].get("database"),
@@ -665,46 +894,70 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
             # lp:1881596. Let's just silently give up:
             return
 
-        for prefix in receiving_interface.get_prefixes():
+        # These are not prefixed, so only look them up once rather than on
+        # every pass through the loop.
+        _relation_id = unit.relation.relation_id
+        _local_unit = ch_core.hookenv.local_unit()
+        _raw_wait_timeout = receiving_interface.wait_timeout()
+        _raw_ssl_ca = receiving_interface.ssl_ca()
+
+        _prefixes = [
+            (prefix,
+             receiving_interface.password(prefix=prefix),
+             receiving_interface.allowed_units(prefix=prefix))
+            for prefix in receiving_interface.get_prefixes()
+            # Do not send the mysqlrouter credentials to the client
+            if prefix != self.db_prefix]
+
+        # Nothing to do if none of the inputs have changed since the
+        # responses were last sent.
+        _inputs = [PROXY_RESPONSES_REVISION,
+                   _relation_id, unit.unit_name, _local_unit,
+                   self.shared_db_address, self.mysqlrouter_port,
+                   _raw_wait_timeout, _raw_ssl_ca, _prefixes]
+        if not reactive.helpers.is_data_changed(
+                PROXY_RESPONSES_DATA_ID, _inputs, hash_type="blake2b"):
+            ch_core.hookenv.log(
+                "db-router responses unchanged, skipping "
+                "proxy_db_and_user_responses", "DEBUG")
+            return
 
-            if prefix in self.db_prefix:
-                # Do not send the mysqlrouter credentials to the client
-                continue
+        # As above, set_db_connection_info only updates the Endpoint's
+        # buffered to_publish data, flushed once at the end of the hook.
+        for prefix, _raw_password, _raw_allowed_units in _prefixes:
 
-            if not receiving_interface.password(prefix=prefix):
+            if not _raw_password:
                 ch_core.hookenv.log(
                     "Skipping proxy_db_and_user_responses as we have no "
                     "relation data on a departing db-router relation. ",
                     "WARNING")
                 return
 
-            _password = json.loads(
-                receiving_interface.password(prefix=prefix))
+            _password = self._json_cached(_raw_password)
 
             # Wait timeout is an optional setting
-            _wait_timeout = receiving_interface.wait_timeout()
+            _wait_timeout = _raw_wait_timeout
             if _wait_timeout:
-                _wait_timeout = json.loads(_wait_timeout)
+                _wait_timeout = self._json_cached(_wait_timeout)
             # SSL CA is an optional setting
-            _ssl_ca = receiving_interface.ssl_ca()
+            _ssl_ca = _raw_ssl_ca
             if _ssl_ca:
-                _ssl_ca = json.loads(_ssl_ca)
+                _ssl_ca = self._json_cached(_ssl_ca)
             else:
                 # Reset ssl_ca in case we previously had it set
                 ch_core.hookenv.log("Proactively resetting ssl_ca", "DEBUG")
                 sending_interface.relations[
-                    unit.relation.relation_id].to_publish_raw["ssl_ca"] = None
+                    _relation_id].to_publish_raw["ssl_ca"] = None
 
-            if ch_core.hookenv.local_unit() in (json.loads(
-                    receiving_interface.allowed_units(prefix=prefix))):
+            if _local_unit in self._json_cached(_raw_allowed_units):
                 _allowed_hosts = unit.unit_name
             else:
                 _allowed_hosts = None
-            if prefix in self._unprefixed:
+            if prefix == self._unprefixed:
                 prefix = None
 
             sending_interface.set_db_connection_info(
-                unit.relation.relation_id,
+                _relation_id,
                 self.shared_db_address,
                 _password,
                 allowed_units=_allowed_hosts,
@@ -713,6 +966,9 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
                 db_port=self.mysqlrouter_port,
                 ssl_ca=_ssl_ca)
 
+        reactive.helpers.data_changed(
+            PROXY_RESPONSES_DATA_ID, _inputs, hash_type="blake2b")
+
     def update_config_parameters(self, parameters, config=None):
         """Update configuration parameters using ConfigParser.
 
@@ -736,7 +992,7 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         :type parameters: dict
         :param config: an optional existing ConfigParser object
         :type config: configparser.ConfigParser
-        :side effect: Writes the mysqlrouter.conf file
+        :side effect: Writes the mysqlrouter.conf file if its content changed
         :returns: This function is called for its side effect
         :rtype: None
         """
@@ -750,17 +1006,26 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
 
         ch_core.hookenv.log("Updating configuration parameters", "DEBUG")
         if not config:
-            config = configparser.ConfigParser()
-            config.read(self.mysqlrouter_conf)
+            config = self._read_config()
+
+        # Any other headings are matched individually
+        matchers = {
+            heading: re.compile(heading).match
+            for heading in parameters if heading not in _SECTION_HEADINGS}
+
+        # Resolve each heading to the first section it matches in a single
+        # pass over the sections; unmatched headings are used verbatim.
+        resolved = {}
+        for section in config.sections():
+            heading = _classify_section(section)
+            if heading in parameters and heading not in resolved:
+                resolved[heading] = section
+            for heading, match in matchers.items():
+                if heading not in resolved and match(section):
+                    resolved[heading] = section
 
         for heading, settings in parameters.items():
-            for section in config.sections():
-                if re.match(heading, section):
-                    translated = section
-                    break
-            else:
-                translated = heading
-
+            translated = resolved.get(heading, heading)
             for param, value in settings.items():
                 # BUG LP#1927981 - heading may not exist during a charm upgrade
                 # Handle missing heading via direct assignment in except.
@@ -769,9 +1034,25 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
                 except KeyError:
                     config[translated] = {param: value}
 
+        # Skip the write when the file already has this content.
+        new_conf = io.StringIO()
+        config.write(new_conf)
+        new_conf = new_conf.getvalue()
+        try:
+            with open(self.mysqlrouter_conf) as configfile:
+                unchanged = configfile.read() == new_conf
+        except OSError:
+            unchanged = False
+        if unchanged:
+            ch_core.hookenv.log(
+                "{} is up to date".format(self.mysqlrouter_conf), "DEBUG")
+            return
+
         ch_core.hookenv.log("Writing {}".format(self.mysqlrouter_conf))
         with open(self.mysqlrouter_conf, 'w') as configfile:
-            config.write(configfile)
+            configfile.write(new_conf)
+        key = self._conf_stat_key()
+        self._conf_cache = None if key is None else (key, config)
 
     def config_changed(self):
         """Config changed.
@@ -804,6 +1085,7 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         ch_core.hookenv.log(
             "Cleaning up (removing) existing configuration files", "INFO")
         if os.path.exists(self.mysqlrouter_working_dir):
+            import shutil
             try:
                 shutil.rmtree(self.mysqlrouter_working_dir)
             except Exception as e:
@@ -834,9 +1116,8 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
 
         # mysql-router pkg version check
         # < 8.0.23, don't add client_ssl_mode
-        if ch_core.host.cmp_pkgrevno("mysql-router", "8.0.23") >= 0:
-            config = configparser.ConfigParser()
-            config.read(self.mysqlrouter_conf)
+        if _pkg_at_least('mysql-router', '8.0.23'):
+            config = self._read_config()
             if 'client_ssl_cert' in config['DEFAULT']:
                 if self.ssl_ca:
                     ch_core.hookenv.log("TLS mode PASSTHROUGH", "DEBUG")
@@ -849,39 +1130,29 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
                                     "delete client_ssl_mode", "DEBUG")
                 _parameters["DEFAULT"].pop("client_ssl_mode", None)
 
-        if ch_core.host.cmp_pkgrevno('mysql-router', '8.0.27') >= 0:
-            _parameters[DEFAULT_SECTION]["max_total_connections"] = str(
-                self.options.max_connections
-            )
-        else:
-            _parameters[DEFAULT_SECTION]["max_connections"] = str(
-                self.options.max_connections
-            )
+        # mysql-router >= 8.0.27 renamed max_connections
+        _max_conn_key = ("max_total_connections"
+                         if _pkg_at_least('mysql-router', '8.0.27')
+                         else "max_connections")
+        _parameters[DEFAULT_SECTION][_max_conn_key] = str(
+            self.options.max_connections)
 
         return _parameters
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(10),
-        retry=tenacity.retry_if_exception_type(
-            mysql.MySQLdb._exceptions.OperationalError),
-        reraise=True,
-        stop=tenacity.stop_after_attempt(5))
     def retry_conection_check(self):
         """Retry database connection check."""
-        ch_core.hookenv.log("Checking connection through router", "DEBUG")
-        # Only raise an exception if it matches
-        # mysql.MySQLdb._exceptions.OperationalError error 2003 or 2013
-        # LP Bug #1915842 & #1973177
-        self.check_mysql_connection(
-            reraise_on=[
-                self._waiting_for_initial_communication_packet_error,
-                self._cannot_connect_via_ip])
-
-    @tenacity.retry(
-        retry=tenacity.retry_if_exception_type(
-            mysql.MySQLdb._exceptions.OperationalError),
-        reraise=True,
-        stop=tenacity.stop_after_attempt(5))
+        def _check():
+            ch_core.hookenv.log("Checking connection through router", "DEBUG")
+            # Only raise an exception if it matches
+            # mysql.MySQLdb._exceptions.OperationalError error 2003 or 2013
+            # LP Bug #1915842 & #1973177
+            self.check_mysql_connection(
+                reraise_on=[
+                    self._waiting_for_initial_communication_packet_error,
+                    self._cannot_connect_via_ip])
+
+        _retrying(wait=10)(_check)
+
     def custom_restart_function(self, service_name):
         """Tenacity retry custom restart function for restart_on_change
 
@@ -893,11 +1164,14 @@ class MySQLRouterCharm(charms_openstack.charm.OpenStackCharm):
         :returns: This function is called for its side effect
         :rtype: None
         """
-        ch_core.hookenv.log(
-            "Custom restart of {}".format(service_name), "DEBUG")
-        self.service_stop(service_name)
-        self.service_start(service_name)
-        # In the case of the db-router service it reports itself as having
-        # started prior to being fully initialised. So when checking the
-        # connection retry a few times.
-        self.retry_conection_check()
+        def _restart():
+            ch_core.hookenv.log(
+                "Custom restart of {}".format(service_name), "DEBUG")
+            self.service_stop(service_name)
+            self.service_start(service_name)
+            # In the case of the db-router service it reports itself as
+            # having started prior to being fully initialised. So when
+            # checking the connection retry a few times.
+            self.retry_conection_check()
+
+        _retrying()(_restart)
@@ -12,9 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import configparser
 import copy
-import collections
+import itertools
 import json
+import subprocess
+import unittest
 from unittest import mock
 
 import charms_openstack.test_utils as test_utils
@@ -26,7 +29,7 @@ class TestMySQLRouterProperties(test_utils.PatchHelper):
 
     def setUp(self):
         super().setUp()
-        self.cls = mock.MagicMock()
+        self.cls = mock.MagicMock(spec=[])
         self.patch_object(mysql_router.ch_core.hookenv, "local_unit")
         self.patch_object(mysql_router.ch_net_ip, "get_relation_ip")
 
@@ -42,6 +45,12 @@ class TestMySQLRouterProperties(test_utils.PatchHelper):
             mysql_router.db_router_address(self.cls), _addr)
         self.get_relation_ip.assert_called_once_with("db-router")
 
+        # Subsequent lookups are served from the adapter
+        self.get_relation_ip.reset_mock()
+        self.assertEqual(
+            mysql_router.db_router_address(self.cls), _addr)
+        self.get_relation_ip.assert_not_called()
+
 
 class FakeException(Exception):
 
@@ -72,6 +81,144 @@ class FakeConfigParser(dict):
         self.pop(section, None)
 
 
+class TestRun(test_utils.PatchHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.patch_object(mysql_router, "subprocess")
+        self.patch_object(mysql_router.ch_core.hookenv, "log")
+        self.subprocess.CalledProcessError = subprocess.CalledProcessError
+        self.proc = self.subprocess.Popen.return_value.__enter__.return_value
+        self.proc.stdout = ["line one\n", "line two\n"]
+
+    def test_run(self):
+        self.proc.returncode = 0
+        mysql_router._run(["cmd", "arg"])
+        self.subprocess.Popen.assert_called_once_with(
+            ["cmd", "arg"],
+            stdin=None,
+            stdout=self.subprocess.PIPE,
+            stderr=self.subprocess.STDOUT,
+            text=True,
+            errors="replace")
+        self.log.assert_not_called()
+
+    def test_run_stdin(self):
+        self.proc.returncode = 0
+        mysql_router._run(["cmd", "arg"], stdin="secret\n")
+        self.subprocess.Popen.assert_called_once_with(
+            ["cmd", "arg"],
+            stdin=self.subprocess.PIPE,
+            stdout=self.subprocess.PIPE,
+            stderr=self.subprocess.STDOUT,
+            text=True,
+            errors="replace")
+        self.proc.stdin.write.assert_called_once_with("secret\n")
+        self.proc.stdin.close.assert_called_once_with()
+
+    def test_run_stdin_early_exit(self):
+        # The command exits without reading stdin, e.g. a failed bootstrap
+        self.proc.returncode = 1
+        self.proc.stdin.write.side_effect = BrokenPipeError
+        self.proc.stdin.close.side_effect = BrokenPipeError
+        with self.assertRaises(subprocess.CalledProcessError) as ctx:
+            mysql_router._run(["cmd", "arg"], stdin="secret\n")
+        self.assertEqual(ctx.exception.returncode, 1)
+        self.assertEqual(ctx.exception.output, "line one\nline two\n")
+        self.proc.stdin.close.assert_called_once_with()
+
+    def test_run_fails(self):
+        self.proc.returncode = 1
+        with self.assertRaises(subprocess.CalledProcessError) as ctx:
+            mysql_router._run(["cmd", "arg"])
+        self.assertEqual(ctx.exception.returncode, 1)
+        self.assertEqual(ctx.exception.cmd, ["cmd", "arg"])
+        self.assertEqual(ctx.exception.output, "line one\nline two\n")
+
+    def test_run_fails_output_tail(self):
+        self.proc.returncode = 1
+        self.proc.stdout = [
+            "line {}\n".format(i)
+            for i in range(mysql_router.RUN_OUTPUT_TAIL + 5)]
+        with self.assertRaises(subprocess.CalledProcessError) as ctx:
+            mysql_router._run(["cmd", "arg"])
+        self.assertEqual(
+            ctx.exception.output.splitlines(),
+            ["line {}".format(i)
+             for i in range(5, mysql_router.RUN_OUTPUT_TAIL + 5)])
+
+
+class TestPkgAtLeast(test_utils.PatchHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.patch_object(mysql_router.ch_core.host, "cmp_pkgrevno")
+        mysql_router._pkg_at_least.cache_clear()
+        self.addCleanup(mysql_router._pkg_at_least.cache_clear)
+
+    def test_pkg_at_least(self):
+        self.cmp_pkgrevno.return_value = 0
+        self.assertTrue(mysql_router._pkg_at_least("mysql-router", "8.0.22"))
+        self.assertTrue(mysql_router._pkg_at_least("mysql-router", "8.0.22"))
+        self.cmp_pkgrevno.assert_called_once_with("mysql-router", "8.0.22")
+
+        self.cmp_pkgrevno.return_value = -1
+        self.assertFalse(mysql_router._pkg_at_least("mysql-router", "8.0.27"))
+
+
+class TestRetrying(unittest.TestCase):
+
+    def test_retrying(self):
+        self.assertIs(mysql_router._retrying(wait=10),
+                      mysql_router._retrying(wait=10))
+        self.assertIsNot(mysql_router._retrying(),
+                         mysql_router._retrying(wait=10))
+        _fn = mock.MagicMock(return_value="ok")
+        self.assertEqual(mysql_router._retrying()(_fn, "arg"), "ok")
+        _fn.assert_called_once_with("arg")
+
+    def test_retrying_backoff(self):
+        _retrying = mysql_router._retrying(wait=10)
+        _state = mock.MagicMock(attempt_number=1, seconds_since_start=0)
+        self.assertEqual(_retrying.wait(_state), 0.5)
+        _state.attempt_number = 3
+        self.assertEqual(_retrying.wait(_state), 2)
+        _state.attempt_number = 8
+        self.assertEqual(_retrying.wait(_state), 10)
+        # At least 5 attempts and 40 seconds before giving up
+        _state.attempt_number = 5
+        self.assertFalse(_retrying.stop(_state))
+        _state.seconds_since_start = 40
+        self.assertTrue(_retrying.stop(_state))
+        _state.attempt_number = 4
+        self.assertFalse(_retrying.stop(_state))
+
+
+class TestSectionPatterns(unittest.TestCase):
+
+    def test_classify_section(self):
+        for section, heading in (
+                ("DEFAULT", mysql_router.DEFAULT_SECTION),
+                ("logger", mysql_router.LOGGING_SECTION),
+                ("metadata_cache:jujuCluster",
+                 mysql_router.METADATA_CACHE_SECTION),
+                ("routing:jujuCluster_rw", mysql_router.ROUTING_RW_SECTION),
+                ("routing:jujuCluster_x_rw",
+                 mysql_router.ROUTING_X_RW_SECTION),
+                ("routing:jujuCluster_ro", mysql_router.ROUTING_RO_SECTION),
+                ("routing:jujuCluster_x_ro",
+                 mysql_router.ROUTING_X_RO_SECTION),
+                ("routing:jujuCluster_rx", None),
+                ("rest_api", None)):
+            self.assertEqual(mysql_router._classify_section(section), heading)
+
+    def test_trailing_newline(self):
+        self.assertIsNone(
+            mysql_router._classify_section("metadata_cache:juju\n"))
+        self.assertIsNone(
+            mysql_router._classify_section("routing:jujuCluster_rw\n"))
+
+
 class TestMySQLRouterCharm(test_utils.PatchHelper):
 
     def setUp(self):
@@ -82,14 +229,21 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         self.patch_object(mysql_router.reactive.flags, "clear_flag")
         self.patch_object(
             mysql_router.reactive.relations, "endpoint_from_flag")
+        self.patch_object(
+            mysql_router.reactive.helpers, "is_data_changed",
+            return_value=True)
+        self.patch_object(mysql_router.reactive.helpers, "data_changed")
         self.patch_object(mysql_router.ch_net_ip, "get_relation_ip")
         self.patch_object(mysql_router.ch_core.hookenv, "local_unit")
         self.patch_object(mysql_router.ch_core.host, "adduser")
         self.patch_object(mysql_router.ch_core.host, "add_group")
-        self.patch_object(mysql_router.ch_core.host, "user_exists")
-        self.patch_object(mysql_router.ch_core.host, "group_exists")
+        self.patch_object(mysql_router, "pwd")
+        self.patch_object(mysql_router, "grp")
         self.patch_object(mysql_router.ch_core.host, "mkdir")
         self.patch_object(mysql_router.ch_core.host, "cmp_pkgrevno")
+        mysql_router._pkg_at_least.cache_clear()
+        self.addCleanup(mysql_router._pkg_at_least.cache_clear)
+        self.patch_object(mysql_router, "_run")
 
         self.stdout = mock.MagicMock()
         self.subprocess.STDOUT = self.stdout
@@ -152,27 +306,19 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         # This "fake" get_db_data looks a lot like the real thing.
         # Charmhelpers is mocked out entirely and attempting to
         # mock the output made the test setup more difficult.
-        settings = copy.deepcopy(relation_data)
-        databases = collections.OrderedDict()
-
-        singleset = {"database", "username", "hostname"}
-        if singleset.issubset(settings):
-            settings["{}_{}".format(unprefixed, "hostname")] = (
-                settings["hostname"])
-            settings.pop("hostname")
-            settings["{}_{}".format(unprefixed, "database")] = (
-                settings["database"])
-            settings.pop("database")
-            settings["{}_{}".format(unprefixed, "username")] = (
-                settings["username"])
-            settings.pop("username")
-
-        for k, v in settings.items():
-            db = k.split("_")[0]
-            x = "_".join(k.split("_")[1:])
-            if db not in databases:
-                databases[db] = collections.OrderedDict()
-            databases[db][x] = v
+        # Like the real thing, the unprefixed settings come last.
+        settings = relation_data.items()
+        singleset = ("hostname", "database", "username")
+        if set(singleset).issubset(relation_data):
+            settings = itertools.chain(
+                ((k, v) for k, v in settings if k not in singleset),
+                (("{}_{}".format(unprefixed, k), relation_data[k])
+                 for k in singleset))
+
+        databases = {}
+        for k, v in settings:
+            db, _, x = k.partition("_")
+            databases.setdefault(db, {})[x] = v
 
         return databases
 
@@ -211,6 +357,28 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
             mrc.db_router_password,
             _pass)
 
+    def test_json_cached(self):
+        mrc = mysql_router.MySQLRouterCharm()
+        mrc._json_cached.cache_clear()
+        self.assertEqual(mrc._json_cached('"clusterpass"'), "clusterpass")
+        self.assertEqual(mrc._json_cached('"clusterpass"'), "clusterpass")
+        self.assertEqual(mrc._json_cached('["kmr/5"]'), ["kmr/5"])
+        _info = mrc._json_cached.cache_info()
+        self.assertEqual(_info.hits, 1)
+        self.assertEqual(_info.misses, 2)
+
+    def test_json_cached_strings(self):
+        mrc = mysql_router.MySQLRouterCharm()
+        for raw in ('""', '"10.10.10.50"', '"pa\\"ss"', '"a\\\\b"',
+                    '"caf\\u00e9"', '"x" ', '5', 'null', '"'):
+            try:
+                expected = json.loads(raw)
+            except ValueError:
+                with self.assertRaises(ValueError):
+                    mrc._json_cached(raw)
+            else:
+                self.assertEqual(mrc._json_cached(raw), expected)
+
     def test_db_router_address(self):
         _addr = "10.10.10.30"
         self.get_relation_ip.return_value = _addr
@@ -229,6 +397,20 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
             mrc.cluster_address,
             _addr)
 
+    def test_ssl_ca(self):
+        self.endpoint_from_flag.return_value = self.db_router
+        self.db_router.ssl_ca.return_value = '"CACERT"'
+        mrc = mysql_router.MySQLRouterCharm()
+        self.assertEqual(mrc.ssl_ca, "CACERT")
+        self.endpoint_from_flag.assert_called_once_with("db-router.available")
+        self.db_router.ssl_ca.assert_called_once_with()
+
+        self.db_router.ssl_ca.return_value = None
+        self.assertIsNone(mrc.ssl_ca)
+
+        self.endpoint_from_flag.return_value = None
+        self.assertIsNone(mrc.ssl_ca)
+
     def test_shared_db_address(self):
         mrc = mysql_router.MySQLRouterCharm()
         self.assertEqual(
@@ -267,26 +449,67 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
             "install", "super_install")
         _name = "keystone-mysql-router"
         self.patch_object(mysql_router.ch_core.templating, "render")
+        self.patch_object(mysql_router.reactive.flags, "is_flag_set")
+        self.is_flag_set.return_value = False
         self.os.path.exists.return_value = False
-        self.group_exists.return_value = False
-        self.user_exists.return_value = False
+        self.grp.getgrnam.side_effect = KeyError
+        self.pwd.getpwnam.side_effect = KeyError
         mrc = mysql_router.MySQLRouterCharm()
         mrc.configure_source = mock.MagicMock()
         mrc.name = _name
         mrc.install()
         self.super_install.assert_called_once()
         mrc.configure_source.assert_called_once()
+        self.grp.getgrnam.assert_called_once_with("mysql")
+        self.pwd.getpwnam.assert_called_once_with("mysql")
         self.add_group.assert_called_once_with("mysql", system_group=True)
         self.adduser.assert_called_once_with(
             "mysql", home_dir="/var/lib/mysql", primary_group="mysql",
             shell="/usr/sbin/nologin", system_user=True)
         self.mkdir.assert_called_once_with(
             "/var/lib/mysql", group="mysql", owner="mysql", perms=0o755)
+        self.set_flag.assert_called_once_with(
+            mysql_router.MYSQL_ROUTER_INSTALLED)
 
         self.assertEqual(self.render.call_count, 2)
-        self.subprocess.check_output.assert_called_once_with(
-            ['systemctl', 'enable', _name],
-            stderr=self.subprocess.STDOUT)
+        _loaders = set(
+            c.kwargs["template_loader"] for c in self.render.call_args_list)
+        self.assertEqual(_loaders, {mrc._template_loader()})
+        self._run.assert_called_once_with(['systemctl', 'enable', _name])
+
+    def test_template_loader(self):
+        self.patch("charmhelpers.contrib.openstack.templating.get_loader",
+                   name="get_loader")
+        self.get_loader.side_effect = lambda path, release: (path, release)
+        mrc = mysql_router.MySQLRouterCharm()
+        mrc.release = "stein"
+        self.assertEqual(mrc._template_loader(), ("templates/", "stein"))
+        self.assertEqual(mrc._template_loader(), ("templates/", "stein"))
+        self.get_loader.assert_called_once_with("templates/", "stein")
+
+        # Follows a change of release
+        mrc.release = "train"
+        self.assertEqual(mrc._template_loader(), ("templates/", "train"))
+        self.assertEqual(self.get_loader.call_count, 2)
+
+        # Not shared with other instances
+        self.assertIsNone(mysql_router.MySQLRouterCharm._loader_cache)
+
+    def test_install_already_installed(self):
+        self.patch_object(
+            mysql_router.charms_openstack.charm.OpenStackCharm,
+            "install", "super_install")
+        self.patch_object(mysql_router.ch_core.templating, "render")
+        self.patch_object(mysql_router.reactive.flags, "is_flag_set")
+        self.is_flag_set.return_value = True
+        mrc = mysql_router.MySQLRouterCharm()
+        mrc.configure_source = mock.MagicMock()
+        mrc.install()
+        self.grp.getgrnam.assert_not_called()
+        self.pwd.getpwnam.assert_not_called()
+        self.os.path.exists.assert_not_called()
+        self.set_flag.assert_not_called()
+        self.assertEqual(self.render.call_count, 2)
 
     def test_get_db_helper(self):
         self.patch_object(
@@ -302,6 +525,24 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         self.assertEqual(_helper, mrc.get_db_helper())
         self.MySQL8Helper.assert_called_once()
 
+    def test_db_helper(self):
+        _helper = mock.MagicMock()
+        self.endpoint_from_flag.return_value = self.db_router
+        self.db_router.db_host.return_value = '"10.10.10.70"'
+        self.db_router.password.return_value = '"clusterpass"'
+        mrc = mysql_router.MySQLRouterCharm()
+        mrc.get_db_helper = mock.MagicMock(return_value=_helper)
+
+        # Built once and reused
+        self.assertEqual(_helper, mrc._db_helper)
+        self.assertEqual(_helper, mrc._db_helper)
+        mrc.get_db_helper.assert_called_once_with()
+
+        # Rebuilt when the relation data changes
+        self.db_router.password.return_value = '"newpass"'
+        self.assertEqual(_helper, mrc._db_helper)
+        self.assertEqual(mrc.get_db_helper.call_count, 2)
+
     def test_states_to_check(self):
         self.patch_object(
             mysql_router.charms_openstack.charm.OpenStackCharm,
@@ -328,9 +569,10 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         _user = "mysqlrouteruser"
         _addr = "127.0.0.1"
         _port = 3316
-        _connect_timeout = 30
+        _connect_timeout = 10
         self.endpoint_from_flag.return_value = self.db_router
         self.db_router.password.return_value = _json_pass
+        self.db_router.db_host.return_value = '"10.10.10.70"'
 
         self.patch_object(
             mysql_router.mysql.MySQLdb, "_exceptions")
@@ -353,6 +595,14 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         _helper.connect.assert_called_once_with(
             _user, _pass, _addr, port=_port, connect_timeout=_connect_timeout)
 
+        # Retries wait longer and raise the MySQL error
+        _helper.reset_mock()
+        _helper.connect.side_effect = self._exceptions.OperationalError(2003)
+        with self.assertRaises(self._exceptions.OperationalError):
+            mrc.check_mysql_connection(reraise_on=[2003])
+        _helper.connect.assert_called_once_with(
+            _user, _pass, _addr, port=_port, connect_timeout=30)
+
     def test_custom_assess_status_check(self):
         _check = mock.MagicMock()
         _check.return_value = None, None
@@ -403,16 +653,15 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         # Successful < 8.0.22
         self.cmp_pkgrevno.return_value = -1
         mrc.bootstrap_mysqlrouter()
-        self.subprocess.check_output.assert_called_once_with(
+        self._run.assert_called_once_with(
             [mrc.mysqlrouter_bin, "--user", _user, "--name", mrc.name,
-             "--bootstrap", "{}:{}@{}"
-             .format(mrc.db_router_user, _pass, _addr),
+             "--bootstrap", "{}@{}".format(mrc.db_router_user, _addr),
              "--directory", mrc.mysqlrouter_working_dir,
              "--conf-use-sockets",
              "--conf-bind-address", mrc.shared_db_address,
              "--report-host", mrc.db_router_address,
              "--conf-base-port", _port],
-            stderr=self.stdout)
+            stdin="{}\n".format(_pass))
         self.set_flag.assert_has_calls([
             mock.call(mysql_router.MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED),
             mock.call(mysql_router.MYSQL_ROUTER_BOOTSTRAPPED)])
@@ -420,22 +669,22 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
             mysql_router.MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED)
 
         # Successful >= 8.0.22
-        self.subprocess.reset_mock()
+        self._run.reset_mock()
         self.set_flag.reset_mock()
         self.clear_flag.reset_mock()
         self.cmp_pkgrevno.return_value = 1
+        mysql_router._pkg_at_least.cache_clear()
         mrc.bootstrap_mysqlrouter()
-        self.subprocess.check_output.assert_called_once_with(
+        self._run.assert_called_once_with(
             [mrc.mysqlrouter_bin, "--user", _user, "--name", mrc.name,
-             "--bootstrap", "{}:{}@{}"
-             .format(mrc.db_router_user, _pass, _addr),
+             "--bootstrap", "{}@{}".format(mrc.db_router_user, _addr),
              "--directory", mrc.mysqlrouter_working_dir,
              "--conf-use-sockets",
              "--conf-bind-address", mrc.shared_db_address,
              "--report-host", mrc.db_router_address,
              "--conf-base-port", _port,
              "--disable-rest"],
-            stderr=self.stdout)
+            stdin="{}\n".format(_pass))
         self.set_flag.assert_has_calls([
             mock.call(mysql_router.MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED),
             mock.call(mysql_router.MYSQL_ROUTER_BOOTSTRAPPED)])
@@ -443,41 +692,39 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
             mysql_router.MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED)
 
         # First attempt fail
-        self.subprocess.reset_mock()
+        self._run.reset_mock()
         self.set_flag.reset_mock()
         self.subprocess.CalledProcessError = FakeException
-        self.subprocess.check_output.side_effect = (
-            self.subprocess.CalledProcessError)
+        self._run.side_effect = self.subprocess.CalledProcessError
         mrc.bootstrap_mysqlrouter()
         self.set_flag.assert_called_once_with(
             mysql_router.MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED)
 
         # Bail
-        self.subprocess.reset_mock()
+        self._run.reset_mock()
         self.set_flag.reset_mock()
         self.is_flag_set.return_value = True
         mrc.bootstrap_mysqlrouter()
-        self.subprocess.check_output.assert_not_called()
+        self._run.assert_not_called()
 
         # Second attempt success
-        self.subprocess.reset_mock()
+        self._run.reset_mock()
         self.set_flag.reset_mock()
         self.clear_flag.reset_mock()
         self.cmp_pkgrevno.return_value = 1
         self.is_flag_set.side_effect = [False, True]
-        self.subprocess.check_output.side_effect = None
+        self._run.side_effect = None
         mrc.bootstrap_mysqlrouter()
-        self.subprocess.check_output.assert_called_once_with(
+        self._run.assert_called_once_with(
             [mrc.mysqlrouter_bin, "--user", _user, "--name", mrc.name,
-             "--bootstrap", "{}:{}@{}"
-             .format(mrc.db_router_user, _pass, _addr),
+             "--bootstrap", "{}@{}".format(mrc.db_router_user, _addr),
              "--directory", mrc.mysqlrouter_working_dir,
              "--conf-use-sockets",
              "--conf-bind-address", mrc.shared_db_address,
              "--report-host", mrc.db_router_address,
              "--conf-base-port", _port,
              "--disable-rest", "--force"],
-            stderr=self.stdout)
+            stdin="{}\n".format(_pass))
         self.set_flag.assert_has_calls([
             mock.call(mysql_router.MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED),
             mock.call(mysql_router.MYSQL_ROUTER_BOOTSTRAPPED)])
@@ -521,30 +768,38 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
 
         self.cmp_pkgrevno.return_value = 1
         self.is_flag_set.side_effect = [False, True]
-        self.subprocess.check_output.side_effect = None
+        self._run.side_effect = None
         mrc.bootstrap_mysqlrouter(True)
-        self.subprocess.check_output.assert_called_once_with(
+        self._run.assert_called_once_with(
             [mrc.mysqlrouter_bin, "--user", _user, "--name", mrc.name,
-             "--bootstrap", "{}:{}@{}"
-             .format(mrc.db_router_user, _pass, _addr),
+             "--bootstrap", "{}@{}".format(mrc.db_router_user, _addr),
              "--directory", mrc.mysqlrouter_working_dir,
              "--conf-use-sockets",
              "--conf-bind-address", mrc.shared_db_address,
              "--report-host", mrc.db_router_address,
              "--conf-base-port", _port,
              "--disable-rest", "--force"],
-            stderr=self.stdout)
+            stdin="{}\n".format(_pass))
         self.set_flag.assert_has_calls([
             mock.call(mysql_router.MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED),
             mock.call(mysql_router.MYSQL_ROUTER_BOOTSTRAPPED)])
         self.clear_flag.assert_called_once_with(
             mysql_router.MYSQL_ROUTER_BOOTSTRAP_ATTEMPTED)
+        # The configuration is cleared before the forced bootstrap
+        self.mock_open.return_value.assert_called_once_with(
+            mrc.mysqlrouter_conf, "wb")
+        self.mock_open()().__enter__().write.assert_called_once_with(
+            b"[DEFAULT]\n")
+
+        # Failing to clear it does not prevent the bootstrap
+        self._run.reset_mock()
+        self.is_flag_set.side_effect = [False, True]
+        self.mock_open.return_value.side_effect = OSError("denied")
+        mrc.bootstrap_mysqlrouter(True)
+        self._run.assert_called_once()
 
     def test_validate_configuration_file_exists_and_small_size(self):
-        self.patch_object(mysql_router.os.path, "exists",
-                          return_value=True)
-        self.patch_object(mysql_router.os.path, "getsize",
-                          return_value=500)
+        self.os.stat.return_value.st_size = 500
         self.patch_object(mysql_router.ch_core.hookenv, "log")
         self.patch_object(mysql_router.MySQLRouterCharm,
                           'bootstrap_mysqlrouter')
@@ -556,10 +811,7 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         self.log.assert_not_called()
 
     def test_validate_configuration_file_exists_and_large_size(self):
-        self.patch_object(mysql_router.os.path, "exists",
-                          return_value=True)
-        self.patch_object(mysql_router.os.path, "getsize",
-                          return_value=1500)
+        self.os.stat.return_value.st_size = 1500
         self.patch_object(mysql_router.ch_core.hookenv, "log")
         self.patch_object(mysql_router.MySQLRouterCharm,
                           'bootstrap_mysqlrouter')
@@ -571,8 +823,7 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         self.log.assert_not_called()
 
     def test_validate_configuration_file_not_exists(self):
-        self.patch_object(mysql_router.os.path, "exists",
-                          return_value=False)
+        self.os.stat.side_effect = FileNotFoundError
         self.patch_object(mysql_router.ch_core.hookenv, "log")
         self.patch_object(mysql_router.MySQLRouterCharm,
                           'bootstrap_mysqlrouter')
@@ -722,6 +973,14 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         ]
         self.nova_shared_db.set_db_connection_info.assert_has_calls(
             _calls, any_order=True)
+        # Unprefixed settings are only looked up once for all prefixes
+        self.db_router.wait_timeout.assert_called_once_with()
+        self.db_router.ssl_ca.assert_called_once_with()
+        # and each client's password once, skipping mysqlrouter's own
+        self.assertEqual(
+            self.db_router.password.call_args_list,
+            [mock.call(prefix=_nova), mock.call(prefix=_novaapi),
+             mock.call(prefix=_novacell0)])
 
         # Allowed Units and wait time set correctly
         self.db_router.wait_timeout.return_value = _json_wait_time
@@ -751,6 +1010,68 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         for call in self.nova_shared_db.set_db_connection_info.mock_calls:
             self.assertNotEqual(mrc.db_prefix, call.kwargs.get("prefix"))
 
+    def test_proxy_db_and_user_responses_prefix_substring(self):
+        # Prefixes which are substrings or extensions of db_prefix or
+        # _unprefixed are ordinary client prefixes.
+        _json_pass = '"pass"'
+        _port = 3316
+        self.local_unit.return_value = "unit/0"
+        self.db_router.password.return_value = _json_pass
+        self.db_router.wait_timeout.return_value = None
+        self.db_router.ssl_ca.return_value = None
+        self.db_router.allowed_units.return_value = json.dumps(
+            ["unit/0", "unit/1"])
+        mrc = mysql_router.MySQLRouterCharm()
+        mrc.options.base_port = _port
+        self.db_router.get_prefixes.return_value = [
+            "mysql", mrc.db_prefix, "mysqlrouter_foo", "MR"]
+        mrc.proxy_db_and_user_responses(self.db_router, self.nova_shared_db)
+        _calls = [
+            mock.call(
+                self.nova_shared_db.relation_id, mrc.shared_db_address,
+                "pass", allowed_units=self.nova_unit_name, prefix=_prefix,
+                wait_timeout=None, db_port=_port, ssl_ca=None)
+            for _prefix in ("mysql", "mysqlrouter_foo", "MR")]
+        # Only mysqlrouter's own credentials are held back
+        self.assertEqual(
+            self.nova_shared_db.set_db_connection_info.call_args_list,
+            _calls)
+
+    def test_proxy_db_and_user_responses_unchanged(self):
+        _port = 3316
+        self.local_unit.return_value = "kmr/5"
+        self.db_router.password.return_value = '"pass"'
+        self.db_router.wait_timeout.return_value = None
+        self.db_router.ssl_ca.return_value = None
+        self.db_router.allowed_units.return_value = json.dumps(["kmr/5"])
+        mrc = mysql_router.MySQLRouterCharm()
+        mrc.options.base_port = _port
+        self.db_router.get_prefixes.return_value = [
+            mrc._unprefixed, mrc.db_prefix]
+
+        # Changed, responses are sent and then recorded
+        mrc.proxy_db_and_user_responses(
+            self.db_router, self.keystone_shared_db)
+        self.keystone_shared_db.set_db_connection_info.assert_called_once_with(
+            self.keystone_shared_db.relation_id, mrc.shared_db_address,
+            "pass", allowed_units=self.keystone_unit_name, prefix=None,
+            wait_timeout=None, db_port=_port, ssl_ca=None)
+        _data_id, _inputs = self.is_data_changed.call_args.args
+        self.assertEqual(_data_id, mysql_router.PROXY_RESPONSES_DATA_ID)
+        self.assertIn(mysql_router.PROXY_RESPONSES_REVISION, _inputs)
+        self.data_changed.assert_called_once_with(
+            mysql_router.PROXY_RESPONSES_DATA_ID, _inputs,
+            hash_type="blake2b")
+
+        # Unchanged, nothing is sent or recorded
+        self.keystone_shared_db.set_db_connection_info.reset_mock()
+        self.data_changed.reset_mock()
+        self.is_data_changed.return_value = False
+        mrc.proxy_db_and_user_responses(
+            self.db_router, self.keystone_shared_db)
+        self.keystone_shared_db.set_db_connection_info.assert_not_called()
+        self.data_changed.assert_not_called()
+
     def test_proxy_db_and_user_responses_no_data(self):
         self.db_router.password.return_value = None
 
@@ -760,9 +1081,11 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         mrc.proxy_db_and_user_responses(
             self.db_router, self.keystone_shared_db)
         self.keystone_shared_db.set_db_connection_info.assert_not_called()
+        # Not recorded, so the responses are retried on the next hook
+        self.data_changed.assert_not_called()
 
     def test_update_config_parameters(self):
-        self.patch_object(mysql_router.configparser, "ConfigParser")
+        self.patch_object(configparser, "ConfigParser")
 
         _mock_config_parser = mock.MagicMock()
         self.ConfigParser.return_value = _mock_config_parser
@@ -775,15 +1098,30 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         _mock_config_parser.__getitem__.assert_called_once_with('DEFAULT')
         _mock_config_parser.__getitem__().__setitem__.assert_called_once_with(
             'client_ssl_mode', 'PREFERRED')
-        _mock_config_parser.write.assert_called_once_with(
-            self.mock_open()().__enter__())
+        _mock_config_parser.write.assert_called_once()
+        self.mock_open.return_value.assert_called_with(
+            mrc.mysqlrouter_conf, 'w')
+        self.mock_open()().__enter__().write.assert_called_once_with(
+            _mock_config_parser.write.call_args[0][0].getvalue())
+
+    def test_update_config_parameters_same_content(self):
+        fake_config = FakeConfigParser({"DEFAULT": {}})
+        # FakeConfigParser serializes to nothing, as does the current file
+        _file = self.mock_open.return_value.return_value.__enter__()
+        _file.read.return_value = ""
+
+        mrc = mysql_router.MySQLRouterCharm()
+        mrc.update_config_parameters({}, config=fake_config)
+        self.mock_open.return_value.assert_called_once_with(
+            mrc.mysqlrouter_conf)
+        _file.write.assert_not_called()
 
     def test_update_config_parameters_missing_heading(self):
         # test fix for Bug LP#1927981
         current_config = {"DEFAULT": {"client_ssl_mode": "NONE"}}
         fake_config = FakeConfigParser(current_config)
 
-        self.patch_object(mysql_router.configparser, "ConfigParser",
+        self.patch_object(configparser, "ConfigParser",
                           return_value=fake_config)
 
         # metadata_cache:jujuCluster didn't exist in the previous config so the
@@ -818,7 +1156,7 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         }
         fake_config = FakeConfigParser(current_config)
 
-        self.patch_object(mysql_router.configparser, "ConfigParser",
+        self.patch_object(configparser, "ConfigParser",
                           return_value=fake_config)
 
         # metadata_cache:jujuCluster didn't exist in the previous config so the
@@ -848,11 +1186,57 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         self.assertEqual(fake_config['routing:foo_rw'],
                          {"test": True})
 
+    def test_update_config_parameters_other_regex(self):
+        # Headings without a precompiled pattern are still matched as regexes
+        current_config = {
+            "DEFAULT": {"client_ssl_mode": "NONE"},
+            "routing:foo_special": {"test": 'no'},
+        }
+        fake_config = FakeConfigParser(current_config)
+
+        self.patch_object(configparser, "ConfigParser",
+                          return_value=fake_config)
+
+        _params = {r"routing:[\w$]+_special$": {"test": True}}
+
+        mrc = mysql_router.MySQLRouterCharm()
+        mrc.update_config_parameters(_params)
+        self.assertEqual(fake_config['routing:foo_special'],
+                         {"test": True})
+        self.assertNotIn(r"routing:[\w$]+_special$", fake_config)
+
+    def test_read_config(self):
+        self.patch_object(configparser, "ConfigParser")
+        self.os.stat.return_value = mock.MagicMock(
+            st_mtime_ns=1, st_size=10)
+        mrc = mysql_router.MySQLRouterCharm()
+        self.assertEqual(mrc._read_config(), self.ConfigParser.return_value)
+        self.ConfigParser.return_value.read.assert_called_once_with(
+            mrc.mysqlrouter_conf)
+
+        # Unchanged on disk, the previous parse is reused
+        mrc._read_config()
+        self.ConfigParser.assert_called_once_with()
+
+        # Changed on disk
+        self.os.stat.return_value.st_mtime_ns = 2
+        mrc._read_config()
+        self.assertEqual(self.ConfigParser.call_count, 2)
+
+    def test_read_config_missing(self):
+        self.patch_object(configparser, "ConfigParser")
+        self.os.stat.side_effect = OSError
+        mrc = mysql_router.MySQLRouterCharm()
+        mrc._read_config()
+        mrc._read_config()
+        self.assertEqual(self.ConfigParser.call_count, 2)
+        self.assertIsNone(mrc._conf_cache)
+
     def test_update_config_parameters_not_bootstrapped(self):
         self.patch_object(mysql_router.os.path, "exists",
                           return_value=False)
         mock_config = mock.MagicMock()
-        self.patch_object(mysql_router.configparser, "ConfigParser",
+        self.patch_object(configparser, "ConfigParser",
                           return_value=mock_config)
         mrc = mysql_router.MySQLRouterCharm()
         mrc.update_config_parameters({})
@@ -915,6 +1299,7 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         # Successful > 8.0.27
         # Should use max_total_connections in config
         self.cmp_pkgrevno.return_value = 1
+        mysql_router._pkg_at_least.cache_clear()
         _params["DEFAULT"].pop("max_connections")
         _params["DEFAULT"]["max_total_connections"] = \
             _config_data['max_connections']
@@ -940,8 +1325,10 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         current_config = {"DEFAULT": {"client_ssl_cert": "cert"}}
         fake_config = FakeConfigParser(current_config)
 
-        self.patch_object(mysql_router.configparser, "ConfigParser",
+        self.patch_object(configparser, "ConfigParser",
                           return_value=fake_config)
+        # mysqlrouter.conf has changed on disk
+        self.os.stat.return_value.st_mtime_ns = 2
 
         # With TLS PASSTHROUGH
         self.db_router.ssl_ca.return_value = '"CACERT"'
@@ -995,7 +1382,7 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
             mysql_router.MySQLRouterCharm, '_get_config_parameters',
             return_value=fake_params)
         mock_update_config_params = mock.MagicMock()
-        self.patch_object(mysql_router.configparser, "ConfigParser",
+        self.patch_object(configparser, "ConfigParser",
                           return_value=fake_config)
 
         mrc = mysql_router.MySQLRouterCharm()
@@ -1007,6 +1394,38 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
         mock_update_config_params.assert_called_once_with(
             fake_params, config=fake_config)
 
+    def test_upgrade_charm_single_read_write(self):
+        fake_config = FakeConfigParser(
+            {"DEFAULT": {"client_ssl_cert": "cert"}})
+
+        self.patch_object(mysql_router.charms_openstack.charm.OpenStackCharm,
+                          'upgrade_charm')
+        _config_data = {
+            "ttl": '5',
+            "auth_cache_ttl": '10',
+            "auth_cache_refresh_interval": '7',
+            "max_connections": '1000',
+            "debug": False,
+        }
+        self.patch_object(mysql_router.ch_core.hookenv, "config")
+        self.config.side_effect = (
+            lambda key=None: _config_data[key] if key else _config_data)
+        self.patch_object(configparser, "ConfigParser",
+                          return_value=fake_config)
+        self.endpoint_from_flag.return_value = self.db_router
+        self.db_router.ssl_ca.return_value = None
+        self.cmp_pkgrevno.return_value = 1
+
+        mrc = mysql_router.MySQLRouterCharm()
+        mrc.upgrade_charm()
+        # mysqlrouter.conf is parsed and written exactly once
+        self.ConfigParser.assert_called_once_with()
+        self.assertEqual(self.mock_open.return_value.call_args_list,
+                         [mock.call(mrc.mysqlrouter_conf),
+                          mock.call(mrc.mysqlrouter_conf, 'w')])
+        self.assertEqual(fake_config['DEFAULT']['unknown_config_option'],
+                         'warning')
+
     def test_upgrade_charm_lp1971565(self):
         # test fix for Bug LP#1971565
         current_config = {
@@ -1029,7 +1448,7 @@ class TestMySQLRouterCharm(test_utils.PatchHelper):
             mysql_router.MySQLRouterCharm, '_get_config_parameters',
             return_value=fake_params)
         mock_update_config_params = mock.MagicMock()
-        self.patch_object(mysql_router.configparser, "ConfigParser",
+        self.patch_object(configparser, "ConfigParser",
                           return_value=fake_config)
 
         mrc = mysql_router.MySQLRouterCharm()
@@ -20,69 +20,84 @@ import reactive.mysql_router_handlers as handlers
 import charms_openstack.test_utils as test_utils
 
 
+# Handlers expected to be registered by reactive.mysql_router_handlers
+DEFAULTS = [
+    "config.changed",
+    "upgrade-charm",
+    "charm.installed",
+]
+HOOK_SET = {
+    "when": {
+        "db_router_request": (
+            "db-router.connected", "charm.installed",),
+        "bootstrap_mysqlrouter": (
+            mysql_router.DB_ROUTER_AVAILABLE, "charm.installed",),
+        "start_mysqlrouter": (
+            mysql_router.MYSQL_ROUTER_BOOTSTRAPPED,
+            mysql_router.DB_ROUTER_AVAILABLE, "charm.installed",),
+        "proxy_shared_db_requests": (
+            mysql_router.MYSQL_ROUTER_STARTED,
+            mysql_router.DB_ROUTER_AVAILABLE,
+            "shared-db.available",),
+        "proxy_shared_db_responses": (
+            mysql_router.MYSQL_ROUTER_STARTED,
+            mysql_router.DB_ROUTER_PROXY_AVAILABLE,
+            "shared-db.available",),
+    },
+    "when_not": {
+        "bootstrap_mysqlrouter": (
+            mysql_router.MYSQL_ROUTER_BOOTSTRAPPED,),
+        "start_mysqlrouter": (
+            mysql_router.MYSQL_ROUTER_STARTED,),
+    },
+    "hook": {
+        "stop_charm": (
+            "stop",
+        ),
+        "update_status": (
+            "update-status",
+        ),
+    }
+}
+
+
 class TestRegisteredHooks(test_utils.TestRegisteredHooks):
 
     def test_hooks(self):
-        defaults = [
-            "config.changed",
-            "upgrade-charm",
-            "charm.installed",
-        ]
-        hook_set = {
-            "when": {
-                "db_router_request": (
-                    "db-router.connected", "charm.installed",),
-                "bootstrap_mysqlrouter": (
-                    mysql_router.DB_ROUTER_AVAILABLE, "charm.installed",),
-                "start_mysqlrouter": (
-                    mysql_router.MYSQL_ROUTER_BOOTSTRAPPED,
-                    mysql_router.DB_ROUTER_AVAILABLE, "charm.installed",),
-                "proxy_shared_db_requests": (
-                    mysql_router.MYSQL_ROUTER_STARTED,
-                    mysql_router.DB_ROUTER_AVAILABLE,
-                    "shared-db.available",),
-                "proxy_shared_db_responses": (
-                    mysql_router.MYSQL_ROUTER_STARTED,
-                    mysql_router.DB_ROUTER_PROXY_AVAILABLE,
-                    "shared-db.available",),
-            },
-            "when_not": {
-                "bootstrap_mysqlrouter": (
-                    mysql_router.MYSQL_ROUTER_BOOTSTRAPPED,),
-                "start_mysqlrouter": (
-                    mysql_router.MYSQL_ROUTER_STARTED,),
-            },
-            "hook": {
-                "stop_charm": (
-                    "stop",
-                ),
-                "update_status": (
-                    "update-status",
-                ),
-            }
-        }
         # test that the hooks were registered via the
         # reactive.mysql_router_handlers
-        self.registered_hooks_test_helper(handlers, hook_set, defaults)
+        self.registered_hooks_test_helper(handlers, HOOK_SET, DEFAULTS)
 
 
 class TestMySQLRouterHandlers(test_utils.PatchHelper):
 
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Only the context manager needs MagicMock's magic methods, plain
+        # Mocks are much cheaper to build (bpo-38895). They are built once
+        # and reset for each test.
+        cls.mr = mock.Mock()
+        cls.mr.db_prefix = "mysqlrouter"
+        cls.shared_db = mock.Mock()
+        cls.db_router = mock.Mock()
+
+        # Patched the same way for every test, so only patch it once
+        patcher = mock.patch.object(handlers.charm, "provide_charm_instance")
+        cls.provide_charm_instance = patcher.start()
+        cls.addClassCleanup(patcher.stop)
+        _instance_cm = cls.provide_charm_instance.return_value
+        _instance_cm.__enter__.return_value = cls.mr
+        _instance_cm.__exit__.return_value = None
+
     def setUp(self):
         super().setUp()
         self.patch_release(
             mysql_router.MySQLRouterCharm.release)
 
-        self.mr = mock.MagicMock()
-        self.mr.db_prefix = "mysqlrouter"
-
-        self.patch_object(handlers.charm, "provide_charm_instance",
-                          new=mock.MagicMock())
-        self.provide_charm_instance().__enter__.return_value = (self.mr)
-        self.provide_charm_instance().__exit__.return_value = None
-
-        self.shared_db = mock.MagicMock()
-        self.db_router = mock.MagicMock()
+        self.provide_charm_instance.reset_mock()
+        for _mock in (self.mr, self.shared_db, self.db_router):
+            _mock.reset_mock(return_value=True, side_effect=True)
 
     def test_db_router_request(self):
         handlers.db_router_request(self.db_router)
@@ -105,3 +120,8 @@ class TestMySQLRouterHandlers(test_utils.PatchHelper):
         handlers.proxy_shared_db_responses(self.shared_db, self.db_router)
         self.mr.proxy_db_and_user_responses.assert_called_once_with(
             self.db_router, self.shared_db)
+
+    def test_update_status(self):
+        handlers.update_status()
+        self.mr.validate_configuration.assert_called_once_with()
+        self.mr.assess_status.assert_called_once_with()